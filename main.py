@@ -1,89 +1,617 @@
 import os
+import atexit
+import asyncio
+import re
 import time
+import hashlib
+import threading
+from urllib.parse import parse_qsl, quote_plus, urlencode, urlsplit, urlunsplit
+import aiohttp
+import diskcache
+import faiss
+import lxml.html
+import numpy as np
+import orjson
 import streamlit as st
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
+import tiktoken
+import trafilatura
+import xxhash
 from dotenv import load_dotenv
-from groq import Groq
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright
+from sentence_transformers import SentenceTransformer
+from groq import APIError, Groq
 
 # Load API key
 load_dotenv()
 api_key = os.getenv("GROQ_API_KEY")
 
-# Set up Groq client
-client = Groq(api_key=api_key)
+# Set up Groq client once per server process rather than on every rerun
+@st.cache_resource
+def get_groq_client():
+    return Groq(api_key=api_key)
 
-# Selenium setup
-def get_driver():
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    return webdriver.Chrome(options=chrome_options)
+# Groq model settings
+MODEL = "llama-3.3-70b-versatile"
+TEMPERATURE = 1.0
 
-# Get top 10 Bing links
-def get_top_bing_links(query):
-    driver = get_driver()
-    search_url = f"https://www.bing.com/search?q={query}"
-    driver.get(search_url)
-    time.sleep(2)
+# LLM response cache: exact matches on disk, near-duplicate articles by embedding
+LLM_CACHE_DIR = "./.llmcache"
+LLM_CACHE_TTL = 7 * 24 * 60 * 60
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SEMANTIC_MATCH_THRESHOLD = 0.92
 
+# Articles this similar are treated as copies of one story and summarized once
+DUPLICATE_ARTICLE_THRESHOLD = 0.9
+DUPLICATE_EMBED_TOKENS = 512
+
+# Scraped text and summary per URL are reused for a day
+URL_CACHE_TTL = 24 * 60 * 60
+TRACKING_PARAMS = {"fbclid", "gclid"}
+
+# Successfully fetched page text is reused for an hour
+PAGE_CACHE_TTL = 60 * 60
+
+# Article text sent to the LLM is capped by tokens, split evenly across the batch
+ARTICLE_TOKEN_BUDGET = 6000
+TOKENIZER = tiktoken.get_encoding("cl100k_base")
+WHITESPACE = re.compile(r'\s+')
+
+# Number of warm browser tabs kept open; also caps how many render at once
+BROWSER_POOL_SIZE = 4
+
+# HTTP settings for fetching Bing and article pages
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-US,en;q=0.9",
+}
+FETCH_TIMEOUT = aiohttp.ClientTimeout(total=15)
+MAX_CONCURRENT_FETCHES = 10
+
+# Only the page text is read, so the browser skips everything else
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+
+async def block_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+# Raised to keep an empty search out of st.cache_data
+class NoSearchResults(Exception):
+    pass
+
+# Search results are memoized for an hour across reruns. An empty result (bot
+# challenge, network error) raises instead, since st.cache_data never stores
+# exceptions, so the next search tries again.
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_bing_links(query):
+    links = asyncio.run(get_top_bing_links(query))
+    if not links:
+        # Bing served a bot challenge (or nothing); retry in a real browser
+        html = run_with_browser(
+            lambda browser, pages: render_html_with_browser(
+                browser, pages, bing_search_url(query), "li.b_algo h2 a"
+            ),
+            "",
+        )
+        links = parse_bing_links(html)
+    if not links:
+        raise NoSearchResults(query)
+    return links
+
+def search_bing(query):
+    try:
+        return cached_bing_links(query)
+    except NoSearchResults:
+        return []
+
+# Page text is memoized per URL for an hour; failed fetches aren't stored
+def extract_articles(urls):
+    cache = get_llm_cache()
+    texts = [cache.get("page:" + url) for url in urls]
+    missing = [i for i, text in enumerate(texts) if text is None]
+    if not missing:
+        return texts
+
+    fetched = asyncio.run(extract_texts_from_urls([urls[i] for i in missing]))
+    for i, text in zip(missing, fetched):
+        texts[i] = text
+
+    js_indexes = [i for i in missing if texts[i] is None]
+    if js_indexes:
+        rendered = render_texts_with_browser([urls[i] for i in js_indexes])
+        for i, text in zip(js_indexes, rendered):
+            texts[i] = text
+
+    for i in missing:
+        texts[i] = texts[i] or ""
+        if texts[i].strip():
+            cache.set("page:" + urls[i], texts[i], expire=PAGE_CACHE_TTL)
+    return texts
+
+# Canonical form of a URL: lowercase host, no tracking parameters or fragment
+def normalize_url(url):
+    parts = urlsplit(url)
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.startswith("utm_") and key not in TRACKING_PARAMS
+    ]
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+def bing_search_url(query):
+    return f"https://www.bing.com/search?q={quote_plus(query)}"
+
+# Top 10 result links from a Bing results page
+def parse_bing_links(html):
+    if not html.strip():
+        return []
+    tree = lxml.html.fromstring(html)
     links = []
-    results = driver.find_elements(By.CSS_SELECTOR, 'li.b_algo h2 a')
-    for r in results[:10]:
-        url = r.get_attribute('href')
+    for a in tree.cssselect("li.b_algo h2 a"):
+        url = a.get("href")
         if url:
             links.append(url)
+    return links[:10]
 
-    driver.quit()
-    return links
+# Get top 10 Bing links over plain HTTP
+async def get_top_bing_links(query):
+    try:
+        async with aiohttp.ClientSession(headers=HEADERS, timeout=FETCH_TIMEOUT) as session:
+            async with session.get(bing_search_url(query)) as response:
+                html = await response.text(errors="replace")
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return []
+    return parse_bing_links(html)
+
+# Main article text of a page, without navigation, banners or comments
+def extract_text(html):
+    return trafilatura.extract(html, include_comments=False, include_tables=False, favor_precision=True) or ""
+
+# Collapse runs of whitespace
+def clean_text(text):
+    return WHITESPACE.sub(' ', text).strip()
+
+# Collapse whitespace and cut the text to at most max_tokens tokens
+def clean_and_limit_text(text, max_tokens):
+    text = clean_text(text)
+    ids = TOKENIZER.encode(text, disallowed_special=())
+    if len(ids) <= max_tokens:
+        return text
+    return TOKENIZER.decode(ids[:max_tokens])
+
+# Background event loop that owns the browser, so it outlives reruns and
+# asyncio.run() calls
+@st.cache_resource
+def get_browser_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+async def new_pooled_page(browser):
+    context = await browser.new_context(java_script_enabled=True, user_agent=HEADERS["User-Agent"])
+    await context.route("**/*", block_resources)
+    return await context.new_page()
+
+# One headless Chromium with a fixed pool of tabs (one context each). Launch
+# errors propagate and aren't cached, so the next call tries again.
+@st.cache_resource
+def get_browser_pool():
+    async def start():
+        playwright = await async_playwright().start()
+        try:
+            browser = await playwright.chromium.launch(headless=True)
+            pages = asyncio.Queue(maxsize=BROWSER_POOL_SIZE)
+            for _ in range(BROWSER_POOL_SIZE):
+                pages.put_nowait(await new_pooled_page(browser))
+        except Exception:
+            await playwright.stop()
+            raise
+        return playwright, browser, pages
 
-# Extract content from a URL
-def extract_text_from_url(url):
+    async def stop():
+        try:
+            await browser.close()
+        except Exception:
+            pass
+        try:
+            await playwright.stop()
+        except Exception:
+            pass
+
+    loop = get_browser_loop()
+    playwright, browser, pages = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    atexit.register(lambda: asyncio.run_coroutine_threadsafe(stop(), loop).result(timeout=10))
+    return browser, pages, stop
+
+# Run coro_fn(browser, pages) on the pool's loop. Returns default if Chromium
+# can't be launched, and drops the pool if Chromium died so the next call
+# relaunches it.
+def run_with_browser(coro_fn, default):
+    loop = get_browser_loop()
+    try:
+        browser, pages, stop = get_browser_pool()
+    except Exception:
+        return default
+    result = asyncio.run_coroutine_threadsafe(coro_fn(browser, pages), loop).result()
+    if not browser.is_connected():
+        get_browser_pool.clear()
+        asyncio.run_coroutine_threadsafe(stop(), loop)
+    return result
+
+# Tab to hand back to the pool with the last site's storage and cookies cleared
+# and navigated to about:blank (stopping its scripts), or None if it can't be
+# reused, in which case the next taker opens a fresh one
+async def recycle_page(page):
+    if page is None:
+        return None
+    try:
+        if not page.is_closed():
+            await page.evaluate("() => { try { localStorage.clear(); sessionStorage.clear(); } catch (e) {} }")
+            await page.goto("about:blank")
+            await page.context.clear_cookies()
+            return page
+    except Exception:
+        pass
     try:
-        driver = get_driver()
-        driver.get(url)
-        time.sleep(2)
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        paragraphs = soup.find_all('p')
-        text = ' '.join(p.get_text() for p in paragraphs)
-        driver.quit()
-        return text[:2000]  # Limit size per URL
-    except Exception as e:
-        return f"Failed to extract from {url}: {e}"
-
-# Query Groq model for summary
-def get_summary_from_llm(content):
-    prompt = f"Summarize the following content:\n\n{content}"
-    response = client.chat.completions.create(
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
-        model="llama-3.3-70b-versatile",
-        stream=False,
+        await page.context.close()
+    except Exception:
+        pass
+    return None
+
+# Load a URL in a pooled tab and return its HTML once selector has rendered
+async def render_html_with_browser(browser, pages, url, selector):
+    page = await pages.get()
+    try:
+        if page is None:
+            page = await new_pooled_page(browser)
+        await page.goto(url, wait_until="domcontentloaded")
+        try:
+            await page.wait_for_selector(selector, timeout=5000)
+        except PlaywrightTimeoutError:
+            pass  # Use whatever has rendered so far
+        return await page.content()
+    except Exception:
+        return ""
+    finally:
+        pages.put_nowait(await recycle_page(page))
+
+async def render_all_with_browser(browser, pages, urls):
+    return await asyncio.gather(*[render_html_with_browser(browser, pages, url, "p") for url in urls])
+
+# Extract content from URLs with a real browser (for JS-rendered pages). Text is
+# extracted here rather than on the browser loop, which every session shares.
+def render_texts_with_browser(urls):
+    htmls = run_with_browser(
+        lambda browser, pages: render_all_with_browser(browser, pages, urls), [""] * len(urls)
     )
-    return response.choices[0].message.content
+    return [extract_text(html) if html else "" for html in htmls]
+
+# Fetch the HTML of an article page, or "" if it failed
+async def fetch_html(session, semaphore, url):
+    try:
+        async with semaphore:
+            async with session.get(url) as response:
+                # Error pages (403, 429, paywalls...) and non-HTML files aren't articles
+                if response.status >= 400 or "html" not in response.content_type:
+                    return ""
+                return await response.text(errors="replace")
+    except Exception:
+        return ""
+
+# Page text, or None if the page needs JavaScript to render
+def extract_text_or_none(html):
+    text = extract_text(html) if html else ""
+    if not text.strip() and '<noscript' in html.lower():
+        return None
+    return text
+
+# Fetch all URLs concurrently, then extract text once no fetches are in flight
+async def extract_texts_from_urls(urls):
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=FETCH_TIMEOUT) as session:
+        htmls = await asyncio.gather(*[fetch_html(session, semaphore, url) for url in urls])
+    return [extract_text_or_none(html) for html in htmls]
+
+@st.cache_resource
+def get_llm_cache():
+    return diskcache.Cache(LLM_CACHE_DIR)
+
+@st.cache_resource
+def get_embedding_model():
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+# Cache key for a response, tied to the model and sampling settings; parts are
+# NUL-separated so ("ab", "c") and ("a", "bc") don't collide
+def llm_cache_key(*parts):
+    return hashlib.sha256("\x00".join((MODEL, str(TEMPERATURE)) + parts).encode()).hexdigest()
+
+# Normalized embedding(s), so inner product is cosine similarity
+def embed_text(texts):
+    return get_embedding_model().encode(texts, normalize_embeddings=True).astype(np.float32)
+
+# Group syndicated copies of the same article: identical text by hash, then
+# near-duplicates by embedding similarity. Maps each group's longest article to
+# the URLs of its copies.
+def group_duplicate_articles(articles):
+    by_hash = {}
+    for url, text in articles.items():
+        digest = xxhash.xxh64(clean_text(text).lower()).hexdigest()
+        by_hash.setdefault(digest, []).append(url)
+    groups = {urls[0]: urls[1:] for urls in by_hash.values()}
+    if len(groups) < 2:
+        return groups
+
+    reps = sorted(groups, key=lambda url: len(articles[url]), reverse=True)
+    heads = [
+        TOKENIZER.decode(TOKENIZER.encode(articles[url], disallowed_special=())[:DUPLICATE_EMBED_TOKENS])
+        for url in reps
+    ]
+    embeddings = embed_text(heads)
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+    lims, _, ids = index.range_search(embeddings, DUPLICATE_ARTICLE_THRESHOLD)
+
+    result = {}
+    assigned = set()
+    for i, url in enumerate(reps):
+        if i in assigned:
+            continue
+        assigned.add(i)
+        result[url] = list(groups[url])
+        for j in ids[lims[i]:lims[i + 1]]:
+            if j not in assigned:
+                assigned.add(j)
+                result[url] += [reps[j]] + groups[reps[j]]
+    return result
+
+# In-memory FAISS index over every cached article embedding; row i maps to keys[i]
+@st.cache_resource
+def get_semantic_index():
+    index = faiss.IndexFlatIP(get_embedding_model().get_sentence_embedding_dimension())
+    keys = []
+    cache = get_llm_cache()
+    for key in list(cache.iterkeys()):
+        if key.startswith("emb:"):
+            embedding = cache.get(key)
+            if embedding is not None:
+                index.add(embedding[None, :])
+                keys.append(key[len("emb:"):])
+    return index, keys, threading.Lock()
+
+# Summary of the most similar cached article, if it is close enough
+def find_similar_summary(embedding):
+    index, keys, lock = get_semantic_index()
+    with lock:
+        if index.ntotal == 0:
+            return None
+        scores, ids = index.search(embedding[None, :], 1)
+    if scores[0][0] < SEMANTIC_MATCH_THRESHOLD:
+        return None
+    return get_llm_cache().get(keys[ids[0][0]])
+
+def add_to_semantic_index(key, embedding):
+    index, keys, lock = get_semantic_index()
+    get_llm_cache().set("emb:" + key, embedding, expire=LLM_CACHE_TTL)
+    with lock:
+        index.add(embedding[None, :])
+        keys.append(key)
+
+# Per-article summaries from a batched reply, keyed 1..count. Anything but
+# exactly one string summary per article number rejects the whole batch, since a
+# misnumbered reply would attach (and cache) summaries on the wrong articles.
+def parse_batch_summaries(parsed, count):
+    batch = parsed.get("summaries") if isinstance(parsed, dict) else None
+    if not isinstance(batch, list) or len(batch) != count:
+        return {}
+
+    by_idx = {}
+    for item in batch:
+        if not isinstance(item, dict) or not isinstance(item.get("summary"), str):
+            return {}
+        try:
+            idx = int(item.get("source_idx"))
+            if idx != float(item.get("source_idx")):
+                return {}
+        except (TypeError, ValueError):
+            return {}
+        by_idx[idx] = item["summary"]
+
+    if set(by_idx) != set(range(1, count + 1)):
+        return {}
+    return by_idx
+
+# Summarize each article with one batched request; summaries come back in input order.
+# Caches are keyed on the full text; only the prompt is cut to the token budget.
+def summarize_articles(contents):
+    cache = get_llm_cache()
+    summaries = [cache.get(llm_cache_key(content)) for content in contents]
+    missing = [i for i, summary in enumerate(summaries) if summary is None]
+    if not missing:
+        return summaries
+
+    uncached = []
+    for i, embedding in zip(missing, embed_text([contents[i] for i in missing])):
+        summary = find_similar_summary(embedding)
+        if summary is None:
+            uncached.append((i, embedding))
+        else:
+            cache.set(llm_cache_key(contents[i]), summary, expire=LLM_CACHE_TTL)
+            summaries[i] = summary
+
+    if uncached:
+        max_tokens = ARTICLE_TOKEN_BUDGET // len(uncached)
+        articles = "\n\n".join(
+            f"[[Article {n}]]\n{clean_and_limit_text(contents[i], max_tokens)}"
+            for n, (i, _) in enumerate(uncached, 1)
+        )
+        prompt = (
+            "Summarize each article separately. Return a JSON object of the form "
+            '{"summaries": [{"source_idx": <article number>, "summary": "<summary>"}]} '
+            "with one entry per article.\n\n" + articles
+        )
+        # A failed or malformed reply leaves these articles unsummarized
+        # rather than failing the whole search
+        try:
+            response = get_groq_client().chat.completions.create(
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                model=MODEL,
+                temperature=TEMPERATURE,
+                response_format={"type": "json_object"},
+                stream=False,
+            )
+            parsed = orjson.loads(response.choices[0].message.content or "{}")
+        except (APIError, orjson.JSONDecodeError):
+            parsed = {}
+        by_idx = parse_batch_summaries(parsed, len(uncached))
+
+        for n, (i, embedding) in enumerate(uncached, 1):
+            summary = by_idx.get(n)
+            if not summary:
+                summaries[i] = ""
+                continue
+            key = llm_cache_key(contents[i])
+            cache.set(key, summary, expire=LLM_CACHE_TTL)
+            add_to_semantic_index(key, embedding)
+            summaries[i] = summary
+
+    return summaries
+
+# Query Groq model for summary, rendering tokens into placeholder as they arrive.
+# Returns None if the request fails.
+def get_summary_from_llm(query, content, placeholder):
+    cache = get_llm_cache()
+    key = llm_cache_key(query, content)
+    summary = cache.get(key)
+    if summary is not None:
+        placeholder.markdown(summary)
+        return summary
+
+    prompt = f"Summarize the following content for the search query \"{query}\":\n\n{content}"
+    summary = ""
+    try:
+        response = get_groq_client().chat.completions.create(
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            model=MODEL,
+            temperature=TEMPERATURE,
+            stream=True,
+        )
+        for chunk in response:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                summary += delta
+                placeholder.markdown(summary)
+    except APIError as e:
+        st.error(f"Summary generation failed: {e}")
+        return None
+
+    # Only cache complete, non-empty replies
+    if summary:
+        cache.set(key, summary, expire=LLM_CACHE_TTL)
+    return summary
+
+# List each summarized article with its URL(s)
+def show_sources(sources):
+    st.subheader("📄 Sources:")
+    for article_summary, urls in sources.items():
+        with st.expander(urls[0]):
+            st.write(article_summary)
+            if len(urls) > 1:
+                st.caption("Also published at: " + ", ".join(urls[1:]))
 
 # Streamlit UI
 st.title("Search Summarizer using Bing + LLM")
 
 query = st.text_input("Enter your search query:")
 
-if st.button("Search and Summarize") and query:
+# Results of the last search live in session state, so widget interactions
+# that rerun the script redraw them instead of searching again. An explicit
+# click always searches; the caches keep a repeat cheap.
+search_clicked = st.button("Search and Summarize")
+
+if search_clicked and query:
+    st.session_state.pop("results", None)
+    st.session_state.pop("last_query", None)
+
     with st.spinner("Searching Bing..."):
-        links = get_top_bing_links(query)
-    
-    all_content = ""
-    with st.spinner("Extracting content from links..."):
-        for url in links:
-            content = extract_text_from_url(url)
-            all_content += content + "\n\n"
+        links = search_bing(query)
+    if not links:
+        st.warning("Bing didn't return any results. Please try again.")
+        st.stop()
+
+    # Normalized URLs are only used to dedupe and as cache keys; pages are
+    # fetched from the URL Bing returned, since normalizing can change the query
+    originals = {}
+    for url in links:
+        originals.setdefault(normalize_url(url), url)
+    links = list(originals)
+
+    # Reuse anything already scraped and summarized this session or in the last
+    # day. The session only keeps summaries; article text stays in the disk cache.
+    if "seen_urls" not in st.session_state:
+        st.session_state.seen_urls = {}
+    seen_urls = st.session_state.seen_urls
+    url_cache = get_llm_cache()
+    summaries = {}
+    for url in links:
+        if url in seen_urls:
+            summaries[url] = seen_urls[url]
+        else:
+            entry = url_cache.get("url:" + url)
+            if entry is not None:
+                summaries[url] = seen_urls[url] = entry[1]
+    new_links = [url for url in links if url not in summaries]
+
+    articles = dict.fromkeys(new_links)
+    if new_links:
+        with st.spinner("Extracting content from links..."):
+            texts = extract_articles([originals[url] for url in new_links])
+            for url, content in zip(new_links, texts):
+                articles[url] = content
 
-    st.success("Content extracted. Generating summary...")
+    articles = {url: content for url, content in articles.items() if content and content.strip()}
+    duplicates = group_duplicate_articles(articles)
+    articles = {url: clean_text(articles[url]) for url in duplicates}
 
-    summary = get_summary_from_llm(all_content)
+    if articles:
+        with st.spinner("Summarizing articles..."):
+            new_summaries = summarize_articles(list(articles.values()))
+        for (url, content), summary in zip(articles.items(), new_summaries):
+            if summary:
+                entry = (content, summary, time.time())
+                for same_url in [url] + duplicates[url]:
+                    seen_urls[same_url] = summary
+                    url_cache.set("url:" + same_url, entry, expire=URL_CACHE_TTL)
+                    summaries[same_url] = summary
+
+    # Copies of one article share a summary; list it once with all its URLs
+    sources = {}
+    for url in links:
+        if url in summaries:
+            sources.setdefault(summaries[url], []).append(originals[url])
+    all_content = "\n\n".join(sources)
+    if not all_content:
+        st.warning("Couldn't extract any content from the search results. Please try again.")
+        st.stop()
+
+    st.success("Articles summarized. Generating summary...")
+
+    st.subheader("🔍 Summary:")
+    summary = get_summary_from_llm(query, all_content, st.empty())
 
+    if summary:
+        st.session_state.results = {"summary": summary, "sources": sources}
+        st.session_state.last_query = query
+    show_sources(sources)
+elif query and query == st.session_state.get("last_query"):
+    results = st.session_state.results
     st.subheader("🔍 Summary:")
-    st.write(summary)
+    st.markdown(results["summary"])
+    show_sources(results["sources"])